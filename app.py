@@ -1,7 +1,13 @@
 import os
+import base64
+import threading
+import numpy as np
 import psycopg
-from dash import Dash, dcc, html, Input, Output, callback, no_update, dash_table
-import plotly.graph_objects as go
+from cachetools import TTLCache
+from psycopg.sql import SQL, Identifier
+from psycopg_pool import ConnectionPool, PoolTimeout
+from dash import Dash, dcc, html, Input, Output, State, callback, no_update, dash_table
+import plotly.io as pio
 
 # =========================
 # Config
@@ -10,73 +16,254 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is missing. Set it in Render → Environment.")
 
+# One pool per gunicorn worker, sized above its thread count (render.yaml):
+# reuses TCP+TLS+auth to Neon across callbacks.
+# Chart/table queries are prepared, so they live on the pooled connections and
+# are bind-and-execute on every later callback.
+# Neon suspends idle compute (5 min by default) and drops its connections. Idle
+# extras are closed before that; rather than a health-check query on every
+# checkout (a round trip per callback), _fetch retries once after POOL.check().
+POOL = ConnectionPool(DATABASE_URL, min_size=2, max_size=10, max_idle=240, open=True)
+
+# Query results keyed by query + pair; repeat loads within the TTL skip the DB
+_CACHE = TTLCache(maxsize=64, ttl=60)
+# Table pages get their own cache so paging never evicts full-history series
+_PAGE_CACHE = TTLCache(maxsize=256, ttl=60)
+_LOCK = threading.Lock()
+
+TABLE_COLS = ["time", "pair", "open", "high", "low", "close", "volume", "rsi14", "macd", "macd_signal"]
+# Chart series; {ma75_expr} is MA75_EXPR, which survives a quoted "MA75" column.
+# time comes back as epoch ms so Plotly gets compact ints, not ISO strings.
+SERIES_SQL = """
+    SELECT (extract(epoch FROM time) * 1000)::bigint AS time_ms,
+           close, macd, macd_signal,
+           bb_upper, bb_lower, bb_basis,
+           ma50, ma100, ma200, sma10, sma50,
+           {ma75_expr}
+    FROM cryptoprices
+    WHERE pair = %s
+    ORDER BY time ASC
+"""
+MA75_EXPR = None  # set once by _resolve_ma75()
+# One page of raw-data table rows, newest first; OFFSET walks the index in order
+PAGE_SQL = f"""
+    SELECT {", ".join(TABLE_COLS)}
+    FROM cryptoprices
+    WHERE pair = %s
+    ORDER BY time DESC
+    LIMIT %s OFFSET %s
+"""
+# Newest row's KPI values: one index probe, independent of history size
+LATEST_SQL = """
+    SELECT close, rsi14, macd, volume
+    FROM cryptoprices
+    WHERE pair = %s
+    ORDER BY time DESC
+    LIMIT 1
+"""
+
+# Non-key columns SERIES_SQL/PAGE_SQL/LATEST_SQL read, so all are index-only scans
+INDEX_INCLUDE = ["open", "high", "low", "close", "volume", "rsi14", "macd", "macd_signal",
+                 "bb_upper", "bb_lower", "bb_basis", "ma50", "ma75", "ma100", "ma200", "sma10", "sma50"]
+
 # =========================
 # DB helpers
 # =========================
+def ensure_indexes():
+    """
+    One-shot migration: covering index on (pair, time DESC) so the
+    WHERE pair = ... ORDER BY time scans need neither a sort nor heap fetches.
+    INCLUDE uses the real column names (ma75 may be stored as quoted "MA75").
+    Built CONCURRENTLY so the ingestion writer is never blocked; that needs
+    autocommit, hence a dedicated connection rather than one from POOL.
+    """
+    with psycopg.connect(DATABASE_URL, autocommit=True) as conn:
+        # A failed or interrupted CONCURRENTLY build leaves an INVALID index that
+        # IF NOT EXISTS would skip forever; drop it unless a build is running now.
+        leftover = conn.execute(
+            "SELECT 1 FROM pg_index "
+            "WHERE indexrelid = to_regclass('cryptoprices_pair_time_idx') AND NOT indisvalid "
+            "AND NOT EXISTS (SELECT 1 FROM pg_stat_progress_create_index "
+            "                WHERE index_relid = to_regclass('cryptoprices_pair_time_idx'))"
+        ).fetchone()
+        if leftover:
+            conn.execute("DROP INDEX CONCURRENTLY IF EXISTS cryptoprices_pair_time_idx")
+
+        existing = {r[0].lower(): r[0] for r in conn.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = 'cryptoprices'"
+        )}
+        include = [Identifier(existing[c]) for c in INDEX_INCLUDE if c in existing]
+        conn.execute(
+            SQL("CREATE INDEX CONCURRENTLY IF NOT EXISTS cryptoprices_pair_time_idx "
+                "ON cryptoprices (pair, time DESC) INCLUDE ({})").format(SQL(", ").join(include))
+        )
+
 def fetch_pairs():
-    """Return list of distinct trading pairs."""
-    with psycopg.connect(DATABASE_URL) as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT DISTINCT pair FROM cryptoprices ORDER BY pair;")
-            return [r[0] for r in cur.fetchall()]
-
-def fetch_data(pair: str, days: int | None):
-    """
-    Fetch OHLC + indicators for a pair. If days is None → fetch all history.
-    Handles quoted \"MA75\" vs unquoted ma75.
-    Returns dict-of-lists for easy Dash plotting (no pandas required).
-    """
-    # Base SELECT (we parametrize the MA75 expression to survive quoted column names)
-    base = """
-        SELECT time, pair, open, high, low, close, volume,
-               avg_volume_20, rsi14, macd, macd_signal,
-               bb_upper, bb_lower, bb_basis,
-               ma50, ma100, ma200, sma10, sma50,
-               vwma10, vwma20, vwma50,
-               {ma75_expr}
-        FROM cryptoprices
-        WHERE pair = %s
-        {time_clause}
-        ORDER BY time ASC
-    """
-    time_clause = "" if days is None else "AND time >= NOW() - make_interval(days => %s)"
-
-    def run_query(ma75_expr):
-        sql = base.format(ma75_expr=ma75_expr, time_clause=time_clause)
-        params = (pair,) if days is None else (pair, days)
-        with psycopg.connect(DATABASE_URL) as conn:
-            with conn.cursor() as cur:
-                cur.execute(sql, params)
-                rows = cur.fetchall()
-                cols = [d.name for d in cur.description]
-        data = {c: [] for c in cols}
-        for r in rows:
-            for c, v in zip(cols, r):
-                data[c].append(v)
-        return data
-
-    # Try unquoted ma75 first; if it errors or missing, retry with quoted "MA75" AS ma75
+    """Return list of distinct trading pairs (cached)."""
+    def load():
+        return list(_fetch("SELECT DISTINCT pair FROM cryptoprices ORDER BY pair", ())["pair"])
+
+    return _cached(("pairs",), load)
+
+_MISS = object()
+
+def _cached(key, load, cache=_CACHE):
+    """
+    Return cache[key], calling load() on a miss (60s TTL). None is a valid,
+    cached result (e.g. a pair with no rows). Treat results as read-only.
+    """
+    with _LOCK:
+        value = cache.get(key, _MISS)
+    if value is _MISS:
+        value = load()
+        with _LOCK:
+            cache[key] = value
+    return value
+
+def _resolve_ma75():
+    """
+    Probe information_schema once for the MA75 column and return the SELECT
+    expression for it: ma75, a quoted "MA75" aliased to ma75, or NULL if absent.
+    """
+    with POOL.connection() as conn:
+        row = conn.execute(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = 'cryptoprices' "
+            "AND lower(column_name) = 'ma75' "
+            "ORDER BY column_name = 'ma75' DESC LIMIT 1"
+        ).fetchone()
+    if row is None:
+        return "NULL::double precision AS ma75"
+    if row[0] == "ma75":
+        return "ma75"
+    return '"{}" AS ma75'.format(row[0].replace('"', '""'))
+
+def _ma75_expr():
+    """MA75_EXPR, resolved on first use if the startup probe could not reach the DB."""
+    global MA75_EXPR
+    if MA75_EXPR is None:
+        MA75_EXPR = _resolve_ma75()
+    return MA75_EXPR
+
+def _series_query(pair: str):
+    """(sql, params) for close + the charted indicators over the pair's full history."""
+    return SERIES_SQL.format(ma75_expr=_ma75_expr()), (pair,)
+
+def _fetch(sql: str, params):
+    """
+    Run one prepared query and return its result as dict-of-tuples
+    (no pandas required).
+    """
     try:
-        data = run_query("ma75")
-        if "ma75" not in data:
-            # When SELECT fails to alias we won't hit this, but keep a guard anyway
-            raise KeyError("ma75 not present")
-        return data
-    except Exception:
-        return run_query('"MA75" AS ma75')
+        return _fetch_once(sql, params)
+    except psycopg.OperationalError:
+        # Typically pooled connections Neon closed while suspended: replace the
+        # broken ones (one pass over the idle pool) and retry this read once.
+        POOL.check()
+        return _fetch_once(sql, params)
+
+def _fetch_once(sql: str, params):
+    with POOL.connection() as conn:
+        # Binary results: float8/int8 arrive as raw bytes instead of text to parse
+        cur = conn.execute(sql, params, prepare=True, binary=True)
+        rows = cur.fetchall()
+        cols = [d.name for d in cur.description]
+    # Transpose rows → columns in C; tuples also keep cached results immutable
+    columns = zip(*rows) if rows else ((),) * len(cols)
+    return dict(zip(cols, columns))
+
+def _chart_arrays(data):
+    """
+    Downcast the chart series once: int64 epoch ms and float32 values (NULL → NaN).
+    Half the memory of Python floats, and precise enough for plotting.
+    """
+    return {c: np.asarray(v, dtype=np.int64 if c == "time_ms" else np.float32) for c, v in data.items()}
+
+def _typed_array(arr, dtype: str):
+    """
+    Plotly's typed-array spec {"dtype", "bdata"}: the raw little-endian bytes,
+    base64'd, which the browser maps straight onto a TypedArray.
+    """
+    buf = np.ascontiguousarray(arr, dtype="<" + dtype).tobytes()
+    return {"dtype": dtype, "bdata": base64.b64encode(buf).decode("ascii")}
+
+def fetch_latest(pair: str):
+    """KPI values (close, rsi14, macd, volume) of the newest row for a pair, or None (cached)."""
+    def load():
+        row = _fetch(LATEST_SQL, (pair,))
+        return {c: v[0] for c, v in row.items()} if row["close"] else None
+
+    return _cached(("latest", pair), load)
+
+def fetch_series(pair: str):
+    """Full-history chart series for a pair as numpy arrays (cached)."""
+    return _cached(("series", pair), lambda: _chart_arrays(_fetch(*_series_query(pair))))
+
+def fetch_page(pair: str, limit: int, offset: int):
+    """One page of raw-data table rows for a pair, newest first (cached)."""
+    return _cached(
+        ("page", pair, limit, offset),
+        lambda: _fetch(PAGE_SQL, (pair, limit, offset)),
+        cache=_PAGE_CACHE,
+    )
 
 # =========================
 # App
 # =========================
+# Same default styling go.Figure() would apply, serialized once
+PLOTLY_TEMPLATE = pio.templates[pio.templates.default].to_plotly_json()
+
+# Three stacked panels (price, MA/bands, MACD) sharing one date x axis. Sent to
+# the browser once; the clientside callback only adds traces and the pair title.
+_PANEL_DOMAINS = [(0.70, 1.0), (0.36, 0.64), (0.0, 0.30)]
+_PANEL_TITLES = ["Price", "Moving Averages / Bands", "MACD / Signal"]
+CHART_LAYOUT = {
+    "template": PLOTLY_TEMPLATE,
+    "height": 1000,
+    "margin": {"l": 20, "r": 20, "t": 40, "b": 20},
+    "xaxis": {"type": "date", "anchor": "y3"},
+    "yaxis": {"domain": _PANEL_DOMAINS[0]},
+    "yaxis2": {"domain": _PANEL_DOMAINS[1]},
+    "yaxis3": {"domain": _PANEL_DOMAINS[2]},
+    "annotations": [
+        {"text": title, "x": 0, "y": top, "xref": "paper", "yref": "paper",
+         "xanchor": "left", "yanchor": "bottom", "showarrow": False, "font": {"size": 16}}
+        for title, (_, top) in zip(_PANEL_TITLES, _PANEL_DOMAINS)
+    ],
+}
+
 app = Dash(__name__)
 server = app.server  # for gunicorn
 
-try:
-    PAIRS = fetch_pairs()
-except Exception:
-    PAIRS = []
+def _warm_up():
+    """
+    Startup DB work, off the import path so the worker boots (and passes
+    Render's health check) without waiting on Neon: open the pool, prime the
+    pair list and MA75 probe, then run the index migration.
+    """
+    global MA75_EXPR
+    try:
+        POOL.wait(timeout=10)  # prewarm min_size connections
+    except PoolTimeout:
+        pass
+
+    try:
+        fetch_pairs()
+    except Exception:
+        pass  # load_pairs retries on page load
+
+    try:
+        MA75_EXPR = _resolve_ma75()
+    except Exception:
+        pass  # resolved lazily by the first chart query instead
 
-default_pair = "BTCUSDT" if "BTCUSDT" in PAIRS else (PAIRS[0] if PAIRS else None)
+    try:
+        ensure_indexes()
+    except Exception:
+        pass  # read-only role or another worker racing us — the app works without it
+
+threading.Thread(target=_warm_up, name="db-warm-up", daemon=True).start()
 
 app.layout = html.Div(
     style={"maxWidth": "1100px", "margin": "0 auto", "padding": "18px"},
@@ -89,8 +276,8 @@ app.layout = html.Div(
                     html.Label("Pair"),
                     dcc.Dropdown(
                         id="pair",
-                        options=[{"label": p, "value": p} for p in PAIRS],
-                        value=default_pair,
+                        options=[],
+                        placeholder="Loading pairs…",
                         clearable=False,
                         style={"minWidth": "240px"},
                     ),
@@ -113,119 +300,215 @@ app.layout = html.Div(
             ],
         ),
         html.Hr(),
+        dcc.Interval(id="init", max_intervals=0),  # fires load_pairs once per page load
         html.Div(id="kpis"),
-        dcc.Graph(id="price_chart"),
-        dcc.Graph(id="ma_chart"),
-        dcc.Graph(id="macd_chart"),
-        html.H3("Raw data (latest 200)"),
-        html.Div(id="table"),
+        dcc.Store(id="raw"),
+        dcc.Store(id="chart-layout", data=CHART_LAYOUT),
+        html.Div(id="charts-status"),
+        dcc.Graph(id="charts"),
+        html.H3("Raw data (newest first)"),
+        html.Div(id="table-status"),
+        # Paged on the server: each page is its own LIMIT/OFFSET query
+        dash_table.DataTable(
+            id="table",
+            columns=[{"name": c, "id": c} for c in TABLE_COLS],
+            data=[],
+            page_action="custom",
+            page_current=0,
+            page_size=20,
+            style_table={"overflowX": "auto"},
+        ),
         html.Div(id="footnote", style={"color": "#666", "marginTop": "8px"}),
     ],
 )
 
 # =========================
-# Callback
+# Callbacks
 # =========================
+@callback(
+    Output("pair", "options"),
+    Output("pair", "value"),
+    Output("pair", "placeholder"),
+    Input("init", "n_intervals"),
+)
+def load_pairs(_):
+    """Fill the pair dropdown after page load (usually a cache hit from _warm_up)."""
+    try:
+        pairs = fetch_pairs()
+    except Exception as e:
+        return [], None, f"Query error: {e}"
+
+    if not pairs:
+        return [], None, "No pairs found in table `cryptoprices`."
+
+    default_pair = "BTCUSDT" if "BTCUSDT" in pairs else pairs[0]
+    return [{"label": p, "value": p} for p in pairs], default_pair, no_update
+
 @callback(
     Output("kpis", "children"),
-    Output("price_chart", "figure"),
-    Output("ma_chart", "figure"),
-    Output("macd_chart", "figure"),
-    Output("table", "children"),
-    Output("footnote", "children"),
     Input("pair", "value"),
-    Input("days", "value"),
-    Input("all-data", "value"),
 )
-def update(pair, days, all_data_values):
+def load_kpis(pair):
+    """
+    KPIs from a LIMIT 1 query, in their own callback so they render as soon
+    as that returns instead of waiting on the full-history series.
+    """
     if not pair:
-        return (
-            html.Div("No pairs found in table `cryptoprices`."),
-            no_update, no_update, no_update, no_update, "",
-        )
-
-    days_param = None if ("ALL" in (all_data_values or [])) else int(days)
+        return no_update  # load_pairs reports an empty table in the dropdown
 
     try:
-        data = fetch_data(pair, days_param)
+        latest = fetch_latest(pair)
     except Exception as e:
-        return (html.Div(f"Query error: {e}"), no_update, no_update, no_update, no_update, "")
-
-    if not data.get("time"):
-        return (html.Div("No rows for the selected filters."), no_update, no_update, no_update, no_update, "")
+        return html.Div(f"Query error: {e}")
 
-    time = data["time"]
-    close = data.get("close", [])
-    volume = data.get("volume", [])
-    rsi14 = data.get("rsi14", [])
-    macd = data.get("macd", [])
-    macd_signal = data.get("macd_signal", [])
+    if latest is None:
+        return html.Div(f"No rows for {pair}.")
 
-    # ---- KPIs
     def fmt(x, d=6):
         try:
             return f"{float(x):.{d}f}"
         except Exception:
             return "—"
 
-    latest = -1
-    kpis = html.Div(
+    return html.Div(
         style={"display": "grid", "gridTemplateColumns": "repeat(4, 1fr)", "gap": "12px"},
         children=[
-            html.Div([html.Div("Close", style={"color": "#666"}), html.H3(fmt(close[latest], 6) if close else "—")]),
-            html.Div([html.Div("RSI(14)", style={"color": "#666"}), html.H3(fmt(rsi14[latest], 2) if rsi14 else "—")]),
-            html.Div([html.Div("MACD", style={"color": "#666"}), html.H3(fmt(macd[latest], 6) if macd else "—")]),
-            html.Div([html.Div("Volume", style={"color": "#666"}), html.H3(fmt(volume[latest], 0) if volume else "—")]),
+            html.Div([html.Div("Close", style={"color": "#666"}), html.H3(fmt(latest["close"], 6))]),
+            html.Div([html.Div("RSI(14)", style={"color": "#666"}), html.H3(fmt(latest["rsi14"], 2))]),
+            html.Div([html.Div("MACD", style={"color": "#666"}), html.H3(fmt(latest["macd"], 6))]),
+            html.Div([html.Div("Volume", style={"color": "#666"}), html.H3(fmt(latest["volume"], 0))]),
         ],
     )
 
-    # ---- Price chart
-    fig_price = go.Figure()
-    fig_price.add_trace(go.Scatter(x=time, y=close, mode="lines", name="Close"))
-    fig_price.update_layout(title=f"Price • {pair}", margin=dict(l=20, r=20, t=40, b=20))
+@callback(
+    Output("raw", "data"),
+    Output("charts-status", "children"),
+    Output("table", "page_count"),
+    Input("pair", "value"),
+    State("table", "page_size"),
+)
+def load_pair(pair, page_size):
+    """
+    Runs once per pair: ships the full-history chart series to the browser
+    (dcc.Store "raw"), where the clientside callback windows it by the days slider.
+    """
+    if not pair:
+        return None, "", no_update
+
+    try:
+        data = fetch_series(pair)
+    except Exception as e:
+        return None, html.Div(f"Query error: {e}"), no_update
+
+    n = len(data["time_ms"])
+    if not n:
+        return None, html.Div(f"No rows for {pair}."), 0
 
-    # ---- MA / Bands chart
-    fig_ma = go.Figure()
-    def maybe_add(name, label=None):
-        series = data.get(name)
-        if series and any(v is not None for v in series):
-            fig_ma.add_trace(go.Scatter(x=time, y=series, mode="lines", name=(label or name).upper()))
+    # ---- Chart traces (full history; the browser slices them per slider value)
+    traces = []
+    def line(y, name, row):
+        traces.append({"type": "scatter", "mode": "lines", "y": _typed_array(y, "f4"), "name": name,
+                       "xaxis": "x", "yaxis": "y" if row == 1 else f"y{row}"})
 
+    line(data["close"], "Close", 1)
     for col in ["sma10", "sma50", "ma50", "ma75", "ma100", "ma200", "bb_upper", "bb_lower", "bb_basis"]:
-        maybe_add(col)
-    fig_ma.update_layout(title="Moving Averages / Bands", margin=dict(l=20, r=20, t=40, b=20))
-
-    # ---- MACD chart
-    fig_macd = go.Figure()
-    if macd and macd_signal:
-        fig_macd.add_trace(go.Scatter(x=time, y=macd, mode="lines", name="MACD"))
-        fig_macd.add_trace(go.Scatter(x=time, y=macd_signal, mode="lines", name="Signal"))
-    fig_macd.update_layout(title="MACD / Signal", margin=dict(l=20, r=20, t=40, b=20))
-
-    # ---- Table (last 200 rows)
-    cols = [c for c in ["time", "pair", "open", "high", "low", "close", "volume", "rsi14", "macd", "macd_signal"] if c in data]
-    tail_len = min(200, len(time))
-    rows = []
-    start = len(time) - tail_len
-    for i in range(start, len(time)):
-        row = {}
-        for c in cols:
-            v = data[c][i]
-            row[c] = v.isoformat(sep=" ") if c == "time" and v else v
-        rows.append(row)
-
-    table = dash_table.DataTable(
-        columns=[{"name": c, "id": c} for c in cols],
-        data=rows,
-        page_size=20,
-        style_table={"overflowX": "auto"},
-        sort_action="native",
-        filter_action="native",
-    )
+        series = data[col]
+        if not np.isnan(series).all():
+            line(series, col.upper(), 2)
+    line(data["macd"], "MACD", 3)
+    line(data["macd_signal"], "Signal", 3)
+
+    # Epoch ms exceeds int32 and Plotly has no int64 typed array; float64 holds it exactly
+    raw = {"pair": pair, "time_ms": _typed_array(data["time_ms"], "f8"), "traces": traces}
+
+    # The series already counts the pair's rows, so the table's page count is free
+    return raw, "", -(-n // page_size)
+
+# A new pair starts the table back on its first page
+app.clientside_callback(
+    "function(pair) { return 0; }",
+    Output("table", "page_current"),
+    Input("pair", "value"),
+)
+
+@callback(
+    Output("table", "data"),
+    Output("table-status", "children"),
+    Input("pair", "value"),
+    Input("table", "page_current"),
+    Input("table", "page_size"),
+)
+def load_table(pair, page_current, page_size):
+    """One table page per request: bytes per callback stay constant however deep the history."""
+    if not pair:
+        return [], ""
+
+    try:
+        page = fetch_page(pair, page_size, (page_current or 0) * page_size)
+    except Exception as e:
+        return [], html.Div(f"Query error: {e}")
+
+    cols = TABLE_COLS
+    times = [t.isoformat(sep=" ") if t else t for t in page["time"]]
+    columns = [times if c == "time" else page[c] for c in cols]
+    rows = [dict(zip(cols, r)) for r in zip(*columns)]  # records via C-level zips
+    return rows, ""
 
-    foot = f"Rows: {len(time):,} • Range: {time[0]} → {time[-1]}"
+# Slider / "all history" changes never leave the browser: decode the stored
+# typed arrays, window them by days (time_ms is ascending, so binary-search
+# the cutoff) and assemble the figure against the static CHART_LAYOUT.
+app.clientside_callback(
+    """
+    function(days, allData, raw, baseLayout) {
+        // Fresh deep copy per call: Plotly.react writes range/autorange back into
+        // the axis objects, which must not leak into the store for the next render
+        const layout = JSON.parse(JSON.stringify(baseLayout));
+        if (!raw) {
+            return [{data: [], layout: layout}, ""];
+        }
+        // Decode the base64 typed arrays once per store payload, not per slider move
+        const decoded = window.__rawDecoded = window.__rawDecoded || new WeakMap();
+        if (!decoded.has(raw)) {
+            const decode = a => {
+                const bin = atob(a.bdata);
+                const bytes = new Uint8Array(bin.length);
+                for (let i = 0; i < bin.length; i++) { bytes[i] = bin.charCodeAt(i); }
+                return a.dtype === "f8" ? new Float64Array(bytes.buffer) : new Float32Array(bytes.buffer);
+            };
+            decoded.set(raw, {t: decode(raw.time_ms), ys: raw.traces.map(tr => decode(tr.y))});
+        }
+        const {t, ys} = decoded.get(raw);
+        let start = 0;
+        if (!(allData || []).includes("ALL")) {
+            const cutoff = Date.now() - days * 86400000;
+            let hi = t.length;
+            while (start < hi) {
+                const mid = (start + hi) >> 1;
+                if (t[mid] < cutoff) { start = mid + 1; } else { hi = mid; }
+            }
+        }
+        if (start >= t.length) {
+            return [{data: [], layout: layout}, "No rows for the selected filters."];
+        }
+
+        // subarray() is a zero-copy view; x becomes a plain array for the date axis
+        const x = Array.from(t.subarray(start));
+        const data = raw.traces.map((tr, i) => Object.assign({}, tr, {x: x, y: ys[i].subarray(start)}));
+        layout.annotations[0].text += " • " + raw.pair;
 
-    return kpis, fig_price, fig_ma, fig_macd, table, foot
+        const fmt = ms => new Date(ms).toISOString().slice(0, 19).replace("T", " ") + "+00:00";
+        const foot = "Rows: " + x.length.toLocaleString("en-US") +
+            " • Range: " + fmt(x[0]) + " → " + fmt(x[x.length - 1]);
+        return [{data: data, layout: layout}, foot];
+    }
+    """,
+    Output("charts", "figure"),
+    Output("footnote", "children"),
+    Input("days", "value"),
+    Input("all-data", "value"),
+    Input("raw", "data"),
+    State("chart-layout", "data"),
+)
 
 # =========================
 # Entry point